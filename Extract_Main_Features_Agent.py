@@ -1,15 +1,11 @@
+import asyncio
 import os
-import json
-from dotenv import load_dotenv
 from pydantic import BaseModel
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.google import GoogleModel
-from pydantic_ai.providers.google import GoogleProvider
 
-# -------------------------------
-# Load environment variables
-# -------------------------------
-load_dotenv()
+from db_cache import get_meeting
+from feature_files import write_main_features
+from llm_clients import run_agent
 
 # -------------------------------
 # Models
@@ -17,17 +13,10 @@ load_dotenv()
 class MainFeatures(BaseModel):
     features: list[str]  # list of main big-picture features
 
-# -------------------------------
-# Setup Google model provider
-# -------------------------------
-provider = GoogleProvider(api_key=os.getenv("GOOGLE_API_KEY"))
-model = GoogleModel("gemini-2.5-flash", provider=provider)
-
 # -------------------------------
 # Extract Feature Agent
 # -------------------------------
 extract_feature_agent = Agent(
-    model,
     output_type=MainFeatures,
     system_prompt=(
         "You are an assistant that extracts ONLY the MAIN BIG-PICTURE FEATURES "
@@ -55,11 +44,8 @@ async def extract_main_features(ctx: RunContext[None], meeting_name: str, file_p
         folder_name = meeting_name.replace(" ", "_")
         db_path = os.path.join(folder_name, "database.json")
         
-        with open(db_path, "r") as db_file:
-            db_data = json.load(db_file)
-
         # Find meeting by file_path
-        meeting = next((m for m in db_data if m.get("filepath") == file_path), None)
+        meeting = await asyncio.to_thread(get_meeting, db_path, file_path)
         if not meeting:
             return f"[DEBUG] No meeting found for file path: {file_path}"
 
@@ -68,7 +54,7 @@ async def extract_main_features(ctx: RunContext[None], meeting_name: str, file_p
             return f"[DEBUG] Meeting at '{file_path}' has no transcript text."
 
         # Step 1 - Extract main features
-        response = await extract_feature_agent.run(transcript_text)
+        response = await run_agent(extract_feature_agent, transcript_text)
         main_features: MainFeatures = response.output
         features_list = main_features.features
 
@@ -79,11 +65,8 @@ async def extract_main_features(ctx: RunContext[None], meeting_name: str, file_p
         
         # Step 2 - Save main_features.txt
         feature_path = os.path.join(folder_name, "main_features.txt")
-        with open(feature_path, "w") as features_file:
-            features_file.write("Extracted Main Features:\n\n")
-            for feat in features_list:
-                features_file.write(f"- {feat}\n")
-                
+        await asyncio.to_thread(write_main_features, feature_path, features_list)
+
         print(f"\n[DEBUG] Main features saved to {feature_path}\n")
 
         return f"Main features extracted: {len(features_list)}\nSaved in {feature_path}"
@@ -1,34 +1,30 @@
+import asyncio
+import logging
 import os
 import json
-from dotenv import load_dotenv
-from pydantic import BaseModel
-from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.google import GoogleModel
-from pydantic_ai.providers.google import GoogleProvider
-import re
+from pydantic import BaseModel, ConfigDict
+from pydantic_ai import RunContext
 
-# -------------------------------
-# Load environment variables
-# -------------------------------
-load_dotenv()
+from feature_files import MAIN_FEATURE_RE, append_and_sync, read_main_features, read_text, safe_name
+from llm_cache import cached_agent, cached_run
+
+logger = logging.getLogger("meeting")
 
 # -------------------------------
 # Models
 # -------------------------------
 class HierarchicalFeatures(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     features: list[str]  # hierarchical features with indentation
 
-# -------------------------------
-# Setup Google model provider
-# -------------------------------
-provider = GoogleProvider(api_key=os.getenv("GOOGLE_API_KEY"))
-model = GoogleModel("gemini-2.5-flash", provider=provider)
+# Max number of concurrent sub-feature extraction calls
+MAX_CONCURRENCY = 6
 
 # -------------------------------
 # Hierarchical Sub-Feature Agent
 # -------------------------------
-extract_hierarchical_agent = Agent(
-    model,
+extract_hierarchical_agent = cached_agent(
     output_type=HierarchicalFeatures,
     system_prompt=(
         
@@ -56,6 +52,52 @@ extract_hierarchical_agent = Agent(
 )
 
 
+# -------------------------------
+# Per-feature helpers
+# -------------------------------
+async def expand_feature(idx: int, main_feature: str, feature_transcript_text: str) -> str:
+    """
+    Runs the hierarchical agent for one main feature and returns its sub_features.txt block.
+    The block always starts with the canonical "idx) main_feature" heading (any heading the
+    model wrote is dropped), so sub_features.txt is keyed by the same names as sub_features.done.
+    """
+    prompt_input = (
+        f"Transcript (related to this feature only):\n{feature_transcript_text}\n\n"
+        f"Main Feature to expand: {idx}) {main_feature}\n\n"
+        "Extract ONLY the sub-features of this feature in proper hierarchical format."
+    )
+
+    output: HierarchicalFeatures = await cached_run(extract_hierarchical_agent, prompt_input, "sub_features")
+
+    lines = [f"{idx}) {main_feature}"]
+    if output and output.features:
+        lines += [
+            line for feature in output.features for line in feature.splitlines()
+            if line.strip() and not MAIN_FEATURE_RE.match(line)
+        ]
+    return "\n".join(lines)
+
+
+def load_completed_features(sub_features_path: str, done_path: str) -> set[str]:
+    """
+    Returns the main features whose sub-features are already in sub_features.txt.
+    sub_features.done lists one completed main feature per line.
+    """
+    if os.path.exists(done_path):
+        with open(done_path, "r", encoding="utf-8") as f:
+            return set(f.read().splitlines())
+
+    if not os.path.exists(sub_features_path):
+        return set()
+
+    # Legacy run without a .done index: rebuild it once from the headings
+    with open(sub_features_path, "r", encoding="utf-8") as f:
+        completed = {m.group(1) for line in f for m in [MAIN_FEATURE_RE.match(line)] if m}
+    with open(done_path, "w", encoding="utf-8") as f:
+        f.writelines(f"{feature}\n" for feature in completed)
+    return completed
+
+
 async def extract_sub_features(ctx: RunContext[None], meeting_name: str, file_path: str) -> str:
     """
     Incrementally extracts hierarchical sub-features for each main feature.
@@ -69,79 +111,75 @@ async def extract_sub_features(ctx: RunContext[None], meeting_name: str, file_pa
         folder_name = meeting_name.replace(" ", "_")
         main_features_path = os.path.join(folder_name, "main_features.txt")
         sub_features_path = os.path.join(folder_name, "sub_features.txt")
+        done_path = os.path.join(folder_name, "sub_features.done")
 
         # -------------------------------
         # Load main features
         # -------------------------------
-        if not os.path.exists(main_features_path):
+        main_features = await asyncio.to_thread(read_main_features, main_features_path)
+        if main_features is None:
             return f"[DEBUG] No main_features.txt found in {folder_name}"
 
-        with open(main_features_path, "r") as f:
-            lines = f.readlines()
-
-        main_features = [line.strip("- ").strip() for line in lines if line.startswith("- ")]
         print(f"[DEBUG] Found {len(main_features)} main features to process.")
 
         # -------------------------------
         # Determine which features already extracted
         # -------------------------------
-        completed_features = set()
-        if os.path.exists(sub_features_path):
-            with open(sub_features_path, "r", encoding="utf-8") as f:
-                content = f.read()
-                for feature in main_features:
-                    if feature in content:
-                        completed_features.add(feature)
+        completed_features = await asyncio.to_thread(load_completed_features, sub_features_path, done_path)
 
         # -------------------------------
-        # Open master sub-features file in append mode
+        # Collect pending features (keep original numbering)
         # -------------------------------
-        with open(sub_features_path, "a", encoding="utf-8") as f:
-            if os.stat(sub_features_path).st_size == 0:
-                f.write("Extracted Hierarchical Features:\n\n")
+        pending = []
+        for idx, main_feature in enumerate(main_features, start=1):
+            if main_feature in completed_features:
+                logger.debug("Skipping already completed feature: %s", main_feature)
+                continue
+            pending.append((idx, main_feature))
+
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+        async def _run_one(idx: int, main_feature: str):
+            logger.debug("Processing main feature %d) %s", idx, main_feature)
+
+            # -------------------------------
+            # Load transcript relevant to this feature
+            # -------------------------------
+            safe_feature = safe_name(main_feature)
+            feature_file = os.path.join(folder_name, safe_feature, f"{safe_feature}.txt")
+
+            feature_transcript_text = await asyncio.to_thread(read_text, feature_file)
+            if feature_transcript_text is None:
+                print(f"[WARN] No detailed transcript file found for {main_feature}, skipping...")
+                return main_feature, None
+
+            # -------------------------------
+            # Run sub-feature extraction
+            # -------------------------------
+            try:
+                async with sem:
+                    return main_feature, await expand_feature(idx, main_feature, feature_transcript_text)
+            except Exception as feature_err:
+                print(f"[ERROR] Failed on feature {main_feature}: {feature_err}")
+                return main_feature, None
 
-            for idx, main_feature in enumerate(main_features, start=1):
-                if main_feature in completed_features:
-                    print(f"[DEBUG] Skipping already completed feature: {main_feature}")
-                    continue
-
-                print(f"\n[DEBUG] Processing main feature {idx}) {main_feature}")
-
-                # -------------------------------
-                # Load transcript relevant to this feature
-                # -------------------------------
-                safe_feature = re.sub(r'[^a-zA-Z0-9_-]', '_', main_feature.lower())
-                feature_file = os.path.join(folder_name, safe_feature, f"{safe_feature}.txt")
-
-                if not os.path.exists(feature_file):
-                    print(f"[WARN] No detailed transcript file found for {main_feature}, skipping...")
+        # -------------------------------
+        # Append each result as soon as it completes (resume-safe)
+        # -------------------------------
+        with open(sub_features_path, "a", encoding="utf-8") as f, \
+                open(done_path, "a", encoding="utf-8") as done_file:
+            if f.tell() == 0:
+                await asyncio.to_thread(append_and_sync, f, "Extracted Hierarchical Features:\n\n")
+
+            tasks = [_run_one(idx, mf) for idx, mf in pending]
+            for next_done in asyncio.as_completed(tasks):
+                main_feature, text = await next_done
+                if text is None:
                     continue
 
-                with open(feature_file, "r", encoding="utf-8") as ft:
-                    feature_transcript_text = ft.read()
-
-                # -------------------------------
-                # Build prompt
-                # -------------------------------
-                prompt_input = (
-                    f"Transcript (related to this feature only):\n{feature_transcript_text}\n\n"
-                    f"Main Feature to expand: {idx}) {main_feature}\n\n"
-                    "Extract ONLY the sub-features of this feature in proper hierarchical format."
-                )
-
-                # -------------------------------
-                # Run sub-feature extraction
-                # -------------------------------
-                result = await extract_hierarchical_agent.run(prompt_input)
-
-                if result.output and result.output.features:
-                    sub_features_text = "\n".join(result.output.features)
-                    f.write(sub_features_text + "\n\n")
-                else:
-                    f.write(f"{idx}) {main_feature}\n\n")
-
-                f.flush()
-                print(f"[DEBUG] Appended {main_feature} → {sub_features_path}")
+                await asyncio.to_thread(append_and_sync, f, text + "\n\n")
+                await asyncio.to_thread(append_and_sync, done_file, main_feature + "\n")
+                logger.debug("Appended %s → %s", main_feature, sub_features_path)
 
         print(f"\n[DEBUG] Hierarchical sub-features saved to {sub_features_path}\n")
         return f"Hierarchical sub-features extracted and saved in {sub_features_path}"
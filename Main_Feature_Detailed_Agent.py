@@ -1,34 +1,30 @@
+import asyncio
+import logging
 import os
-import json
-import re
-from dotenv import load_dotenv
-from pydantic import BaseModel
-from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.google import GoogleModel
-from pydantic_ai.providers.google import GoogleProvider
+from pydantic import BaseModel, ConfigDict
+from pydantic_ai import RunContext
 
-# -------------------------------
-# Load environment variables
-# -------------------------------
-load_dotenv()
+from db_cache import get_meeting
+from feature_files import read_main_features, safe_name
+from llm_cache import cached_agent, cached_run
+
+logger = logging.getLogger("meeting")
 
 # -------------------------------
 # Pydantic Model
 # -------------------------------
 class FeatureDetails(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     details: str
 
-# -------------------------------
-# Setup Google model provider
-# -------------------------------
-provider = GoogleProvider(api_key=os.getenv("GOOGLE_API_KEY"))
-model = GoogleModel("gemini-2.5-flash", provider=provider)
+# Max number of concurrent detail extraction calls
+MAX_CONCURRENCY = 8
 
 # -------------------------------
 # Agent for extracting detailed info
 # -------------------------------
-detailed_agent = Agent(
-    model,
+detailed_agent = cached_agent(
     output_type=FeatureDetails,
     system_prompt=(
         "You are a main feature detail extractor.\n\n"
@@ -45,6 +41,34 @@ detailed_agent = Agent(
 )
 
 
+# -------------------------------
+# Per-feature helpers
+# -------------------------------
+async def extract_feature_details(transcript_text: str, feature: str) -> str:
+    """
+    Runs the detail agent for one main feature and returns the extracted transcript lines.
+    """
+    # Transcript first, feature last: a stable prefix across features (implicit prefix caching)
+    prompt_input = f"Transcript:\n{transcript_text}\n\nMain Feature:\n{feature}"
+    feature_details: FeatureDetails = await cached_run(detailed_agent, prompt_input, "main_feature_details")
+    return feature_details.details
+
+
+def save_feature_details(folder_name: str, feature: str, details: str) -> tuple[str, str]:
+    """
+    Writes <folder>/<feature>/<feature>.txt and returns (path, file text).
+    """
+    safe_feature = safe_name(feature)
+    feature_folder = os.path.join(folder_name, safe_feature)
+    os.makedirs(feature_folder, exist_ok=True)
+
+    feature_text = f"Main Feature: {feature}\n" + "=" * (15 + len(feature)) + "\n\n" + details
+    feature_path = os.path.join(feature_folder, f"{safe_feature}.txt")
+    with open(feature_path, "w", encoding="utf-8") as f:
+        f.write(feature_text)
+    return feature_path, feature_text
+
+
 # -------------------------------
 # Extract Detailed Features
 # -------------------------------
@@ -65,10 +89,7 @@ async def extract_main_features_details(ctx: RunContext[None], meeting_name: str
         # -------------------------------
         # Load transcript
         # -------------------------------
-        with open(db_path, "r") as db_file:
-            db_data = json.load(db_file)
-
-        meeting = next((m for m in db_data if m.get("filepath") == file_path), None)
+        meeting = await asyncio.to_thread(get_meeting, db_path, file_path)
         if not meeting:
             return f"[DEBUG] No meeting found for file path: {file_path}"
 
@@ -79,40 +100,35 @@ async def extract_main_features_details(ctx: RunContext[None], meeting_name: str
         # -------------------------------
         # Load main features
         # -------------------------------
-        if not os.path.exists(main_features_path):
+        main_features = await asyncio.to_thread(read_main_features, main_features_path)
+        if main_features is None:
             return f"[DEBUG] No main_features.txt found in {folder_name}"
 
-        with open(main_features_path, "r") as f:
-            lines = f.readlines()
-
-        main_features = [line.strip("- ").strip() for line in lines if line.startswith("- ")]
         print(f"[DEBUG] Found {len(main_features)} main features.")
 
         # -------------------------------
-        # Process each main feature
+        # Run detail extraction for all features concurrently
         # -------------------------------
-        for feature in main_features:
-            safe_feature = re.sub(r'[^a-zA-Z0-9_-]', '_', feature.lower())
-            feature_folder = os.path.join(folder_name, safe_feature)
-            os.makedirs(feature_folder, exist_ok=True)
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
 
-            print(f"\n[DEBUG] Processing feature: {feature}")
+        async def _one(feature: str):
+            logger.debug("Processing feature: %s", feature)
 
-            # Build prompt
-            prompt_input = f"Transcript:\n{transcript_text}\n\nMain Feature:\n{feature}"
+            async with sem:
+                details = await extract_feature_details(transcript_text, feature)
 
-            # Run agent
-            response = await detailed_agent.run(prompt_input)
-            feature_details: FeatureDetails = response.output
+            # Save as soon as this feature is done, overlapping disk writes with the other calls
+            feature_path, _ = await asyncio.to_thread(save_feature_details, folder_name, feature, details)
+            logger.debug("Saved details for %s -> %s", feature, feature_path)
 
-            # Save details
-            file_path = os.path.join(feature_folder, f"{safe_feature}.txt")
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(f"Main Feature: {feature}\n")
-                f.write("=" * (15 + len(feature)) + "\n\n")
-                f.write(feature_details.details)
+        results = await asyncio.gather(
+            *[_one(feature) for feature in main_features], return_exceptions=True
+        )
 
-            print(f"[DEBUG] Saved details for {feature} -> {file_path}")
+        # Keep the features that succeeded instead of failing the whole batch
+        for feature, result in zip(main_features, results):
+            if isinstance(result, Exception):
+                print(f"[ERROR] Failed on feature {feature}: {result}")
 
         return f"Detailed feature files created inside {folder_name}/<feature_name> folders"
 
@@ -1,42 +1,45 @@
+import asyncio
+import logging
 import os
 import json
-import re
-from dotenv import load_dotenv
-from pydantic import BaseModel
-from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.google import GoogleModel
-from pydantic_ai.providers.google import GoogleProvider
+from pydantic import BaseModel, ConfigDict
+from pydantic_ai import RunContext
 
-# -------------------------------
-# Load environment variables
-# -------------------------------
-load_dotenv()
+from feature_files import parse_sub_features, read_text, safe_name
+from llm_cache import cached_agent, cached_run
+
+logger = logging.getLogger("meeting")
 
 # -------------------------------
 # Models
 # -------------------------------
 class FeatureDetails(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     subfeature: str
     details: str
 
-# -------------------------------
-# Setup Google model provider
-# -------------------------------
-provider = GoogleProvider(api_key=os.getenv("GOOGLE_API_KEY"))
-model = GoogleModel("gemini-2.5-flash", provider=provider)
+class FeatureDetailsBatch(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    items: list[FeatureDetails]  # one entry per feature block, in prompt order
+
+# Max number of concurrent main feature batch calls
+MAX_CONCURRENCY = 6
 
 # -------------------------------
 # Detailed Agent
 # -------------------------------
-detailed_agent = Agent(
-    model,
-    output_type=FeatureDetails,
+detailed_agent = cached_agent(
+    output_type=FeatureDetailsBatch,
     system_prompt=(
         "You are a sub features detail extractor.\n\n"
         "Task:\n"
-        "Given a main feature transcript and SUB FEATURES, extract ONLY the exact lines from the transcript "
-        "that are directly related to that sub features.\n\n"
+        "Given a main feature transcript and a numbered list of FEATURE BLOCKS, extract ONLY the exact lines "
+        "from the transcript that are directly related to each block's sub features.\n\n"
         "Guidelines:\n"
+        "- Return exactly one item per feature block, in the same order as the blocks are given.\n"
+        "- Set 'subfeature' to the first line of the block, without the leading dash.\n"
         "- DO NOT summarize, rephrase, or invent text.\n"
         "- Copy the exact sentences/lines from the transcript verbatim.\n"
         "- Include all relevant discussions, decisions, and technical details word-for-word.\n"
@@ -45,6 +48,127 @@ detailed_agent = Agent(
     ),
 )
 
+# -------------------------------
+# Per-feature helpers
+# -------------------------------
+def group_feature_blocks(sub_features: list[tuple[int, str]]) -> list[list[tuple[int, str]]]:
+    """
+    Groups a main feature's sub-feature lines into blocks by first-level entries ("- ...").
+    Blocks stay as (indent, line) tuples until a prompt actually needs the text.
+    """
+    feature_blocks = []
+    current_block = []
+    for indent, sub in sub_features:
+        if indent <= 3 and sub.startswith("-") and current_block:  # new feature block
+            feature_blocks.append(current_block)
+            current_block = []
+        current_block.append((indent, sub))
+    if current_block:
+        feature_blocks.append(current_block)
+    return feature_blocks
+
+
+async def collect_pending_blocks(main_folder: str, sub_features: list[tuple[int, str]]) -> list[tuple[str, str, str]]:
+    """
+    Returns (block, block_title, sub_file) for every block whose file does not exist yet.
+    Blocks whose titles map to the same file keep only the first one, as a sequential run would.
+    """
+    pending_blocks = []
+    seen_files = set()
+    for block_lines in group_feature_blocks(sub_features):
+        block_title = block_lines[0][1].lstrip("-–• ").strip()
+        safe_sub = safe_name(block_title)
+        sub_file = os.path.join(main_folder, f"{safe_sub}.txt")
+
+        if sub_file in seen_files:
+            logger.debug("Skipping %s, another block already writes %s.", block_title, sub_file)
+            continue
+        seen_files.add(sub_file)
+
+        # ✅ Skip if file already exists (resume mechanism)
+        if await asyncio.to_thread(os.path.exists, sub_file):
+            logger.debug("[RESUME] Skipping %s, file already exists.", block_title)
+            continue
+
+        block = "\n".join(f"{' ' * indent}{sub}" for indent, sub in block_lines)
+        pending_blocks.append((block, block_title, sub_file))
+    return pending_blocks
+
+
+def _save_block(main_feature: str, block: str, block_title: str, sub_file: str, details: str):
+    with open(sub_file, "w", encoding="utf-8") as f:
+        f.write(f"Main Feature: {main_feature}\n")
+        f.write(f"Feature Block:\n{block}\n")
+        f.write("=" * (20 + len(block_title)) + "\n\n")
+        f.write(details)
+
+
+def _block_key(title: str) -> str:
+    return title.lstrip("-–• ").strip().casefold()
+
+
+def match_batch_items(unique_blocks, items: list[FeatureDetails]) -> dict[str, str]:
+    """
+    Maps each block to its details.
+    Items are matched by their 'subfeature' field against the block's first line.
+    Positional pairing is only a fallback when the model returned exactly one item
+    per block but renamed some of them. Blocks without a matching item are left out
+    (retried on the next run).
+    """
+    # Several blocks may share a first line: hand out their items in order
+    details_by_title = {}
+    for item in items:
+        details_by_title.setdefault(_block_key(item.subfeature), []).append(item.details)
+
+    details_by_block = {}
+    for block in unique_blocks:
+        candidates = details_by_title.get(_block_key(block.split("\n", 1)[0]))
+        if candidates:
+            details_by_block[block] = candidates.pop(0)
+
+    if len(details_by_block) < len(unique_blocks) and len(items) == len(unique_blocks):
+        return {block: item.details for block, item in zip(unique_blocks, items)}
+    return details_by_block
+
+
+async def extract_blocks_details(main_feature: str, main_feature_text: str, unique_blocks, destinations) -> None:
+    """
+    Runs one batched detail call for the given blocks of a main feature and writes
+    the result to every (main_feature, block, block_title, sub_file) destination.
+    """
+    blocks_text = "\n\n".join(
+        f"Block {i}:\n{block}" for i, block in enumerate(unique_blocks, start=1)
+    )
+    prompt_input = (
+        f"Transcript (for this main feature only):\n{main_feature_text}\n\n"
+        f"Feature Blocks:\n{blocks_text}"
+    )
+
+    # Only a complete batch is cached; a short one must not be replayed on the next run
+    batch: FeatureDetailsBatch = await cached_run(
+        detailed_agent, prompt_input, "sub_feature_details",
+        cache_if=lambda output: len(output.items) == len(unique_blocks),
+    )
+
+    if len(batch.items) != len(unique_blocks):
+        print(
+            f"[WARN] Expected {len(unique_blocks)} blocks for {main_feature}, "
+            f"got {len(batch.items)}; missing blocks will be retried on next run."
+        )
+
+    details_by_block = match_batch_items(unique_blocks, batch.items)
+    answered = [dest for dest in destinations if dest[1] in details_by_block]
+
+    # Fan the shared result out to every destination file
+    await asyncio.gather(*[
+        asyncio.to_thread(_save_block, mf, block, block_title, sub_file, details_by_block[block])
+        for mf, block, block_title, sub_file in answered
+    ])
+
+    for _, _, block_title, sub_file in answered:
+        logger.debug("Saved details for %s -> %s", block_title, sub_file)
+
+
 # -------------------------------
 # Extract Sub-Feature Details (with resume)
 # -------------------------------
@@ -72,95 +196,57 @@ async def extract_sub_features_details(ctx: RunContext[None], meeting_name: str,
         # -------------------------------
         # Parse sub_features.txt (preserve hierarchy)
         # -------------------------------
-        with open(sub_features_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        main_feature = None
-        sub_features_map = {}
+        def _parse_sub_features() -> dict[str, list[tuple[int, str]]]:
+            with open(sub_features_path, "r", encoding="utf-8") as f:
+                return parse_sub_features(f)
 
-        for line in lines:
-            raw = line.rstrip("\n")
-            stripped = raw.strip()
-
-            if stripped and re.match(r"^\d+\)", stripped):  # main feature line
-                main_feature = stripped.split(")", 1)[1].strip()
-                sub_features_map[main_feature] = []
-            elif stripped.startswith(("-", "–", "•")):
-                # preserve indentation depth (count leading spaces)
-                indent_level = len(raw) - len(raw.lstrip(" "))
-                sub_features_map[main_feature].append((indent_level, stripped))
+        sub_features_map = await asyncio.to_thread(_parse_sub_features)
 
         # -------------------------------
-        # Create folders + generate files
+        # Create folders + collect feature blocks
         # -------------------------------
+        requests = []
         for main_feature, sub_features in sub_features_map.items():
-            safe_main = re.sub(r'[^a-zA-Z0-9_-]', '_', main_feature.lower())
+            safe_main = safe_name(main_feature)
             main_folder = os.path.join(folder_name, safe_main)
-            os.makedirs(main_folder, exist_ok=True)
+            await asyncio.to_thread(os.makedirs, main_folder, exist_ok=True)
 
             # Load only the transcript for this main feature
             main_feature_file = os.path.join(main_folder, f"{safe_main}.txt")
-            if not os.path.exists(main_feature_file):
+            main_feature_text = await asyncio.to_thread(read_text, main_feature_file)
+            if main_feature_text is None:
                 print(f"[WARN] No main feature transcript found for {main_feature}, skipping...")
                 continue
 
-            with open(main_feature_file, "r", encoding="utf-8") as ft:
-                main_feature_text = ft.read()
-
             if not sub_features:
-                print(f"[DEBUG] No sub-features for {main_feature}, skipping.")
+                logger.debug("No sub-features for %s, skipping.", main_feature)
                 continue
 
-            # Group all sub-features into blocks by first-level entries ("- ...")
-            feature_blocks = []
-            current_block = []
-            for indent, sub in sub_features:
-                if indent <= 3 and sub.startswith("-"):  # new feature block
-                    if current_block:
-                        feature_blocks.append("\n".join(current_block))
-                        current_block = []
-                current_block.append(" " * indent + sub)
-            if current_block:
-                feature_blocks.append("\n".join(current_block))
-
-            # -------------------------------
-            # Process each feature block
-            # -------------------------------
-            for block in feature_blocks:
-                block_title = block.split("\n", 1)[0].lstrip("-–• ").strip()
-                safe_sub = re.sub(r'[^a-zA-Z0-9_-]', '_', block_title.lower())
-                sub_file = os.path.join(main_folder, f"{safe_sub}.txt")
-
-                # ✅ Skip if file already exists (resume mechanism)
-                if os.path.exists(sub_file):
-                    print(f"[RESUME] Skipping {block_title}, file already exists.")
-                    continue
-
-                try:
-                    prompt_input = (
-                        f"Transcript (for this main feature only):\n{main_feature_text}\n\n"
-                        f"Feature Block:\n{block}"
-                    )
-
-                    response = await detailed_agent.run(prompt_input)
-                    feature_details: FeatureDetails = response.output
-
-                    with open(sub_file, "w", encoding="utf-8") as f:
-                        f.write(f"Main Feature: {main_feature}\n")
-                        f.write(f"Feature Block:\n{block}\n")
-                        f.write("=" * (20 + len(block_title)) + "\n\n")
-                        f.write(feature_details.details)
-
-                    print(f"[DEBUG] Saved details for {block_title} -> {sub_file}")
-
-                except Exception as block_err:
-                    print(f"[ERROR] Failed on block {block_title}: {block_err}")
-                    # Continue with next block instead of crashing
-                    continue
+            pending_blocks = await collect_pending_blocks(main_folder, sub_features)
+            if not pending_blocks:
+                continue
+
+            # Identical blocks within a feature are sent once and fanned out to each file
+            unique_blocks = tuple(dict.fromkeys(block for block, _, _ in pending_blocks))
+            destinations = [(main_feature, block, block_title, sub_file) for block, block_title, sub_file in pending_blocks]
+            requests.append((main_feature, main_feature_text, unique_blocks, destinations))
+
+        # -------------------------------
+        # Process one batched call per main feature, concurrently
+        # -------------------------------
+        sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+        async def process(main_feature, main_feature_text, unique_blocks, destinations):
+            try:
+                async with sem:
+                    await extract_blocks_details(main_feature, main_feature_text, unique_blocks, destinations)
+            except Exception as feature_err:
+                # Log and let the other main features finish instead of crashing
+                print(f"[ERROR] Failed on main feature {main_feature}: {feature_err}")
+
+        await asyncio.gather(*[process(*request) for request in requests])
 
         return f"Detailed sub-feature files created inside {folder_name}/<main_feature> folders"
 
     except Exception as e:
         return f"[ERROR] {str(e)}"
-
-
@@ -1,15 +1,22 @@
+import asyncio
 import json
 import datetime
 import os
-from dotenv import load_dotenv
+import re
 from pydantic import BaseModel
-from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.google import GoogleModel, GoogleModelSettings
-from pydantic_ai.providers.google import GoogleProvider
+from pydantic_ai import RunContext
+from pydantic_ai.models.google import GoogleModelSettings
 import shutil
 
+from db_cache import dumps, loads
+from feature_files import read_text
+from llm_cache import cached_agent, cached_run
 
-load_dotenv()
+# "Title: ..." / "Subject: ..." / "Meeting: ..." header at the top of a transcript
+TITLE_LINE_RE = re.compile(r"\s*(?:Title|Subject|Meeting):[ \t]*(\S.*)", re.I)
+MAX_TITLE_LENGTH = 80
+# Path separators and characters Windows rejects in folder names
+UNSAFE_TITLE_CHARS_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]+')
 
 # -------------------------------
 # Models
@@ -28,12 +35,8 @@ class MeetingName(BaseModel):
 # -------------------------------
 # Agent Setup
 # -------------------------------
-provider = GoogleProvider(api_key=os.getenv("GOOGLE_API_KEY"))
-model = GoogleModel("gemini-2.5-flash", provider=provider)
-
 # Naming tool agent
-naming_tool_agent = Agent(
-    model,
+naming_tool_agent = cached_agent(
     output_type=MeetingName,
     system_prompt=(
         "You are a meeting naming assistant. "
@@ -44,6 +47,48 @@ naming_tool_agent = Agent(
     model_settings=GoogleModelSettings(temperature=0.1)
 )
 
+# -------------------------------
+# Blocking database.json helpers (call via asyncio.to_thread)
+# -------------------------------
+def load_db() -> list[dict]:
+    """
+    Loads database.json, creating it (or reinitializing it if invalid) as needed.
+    """
+    if not os.path.exists("database.json"):
+        print("\n[WARN] database.json not found, creating a new one\n")
+        write_db([])
+        return []
+
+    with open("database.json", "rb") as db_file:
+        try:
+            return loads(db_file.read())
+        except json.JSONDecodeError:
+            print("[\nWARN] database.json invalid, reinitializing\n")
+            return []
+
+
+def write_db(db_data: list[dict]) -> None:
+    """
+    Writes db_data back to database.json atomically
+    (temp file + os.replace), so a crash mid-write cannot corrupt it.
+    """
+    tmp_path = "database.json.tmp"
+    with open(tmp_path, "wb") as db_file:
+        db_file.write(dumps(db_data))
+    os.replace(tmp_path, "database.json")
+
+
+def clean_title(title: str) -> str:
+    """
+    Makes a meeting title safe to use as a folder name:
+    path separators become "-", and leading/trailing dots, dashes and spaces are dropped,
+    so "Q3/Q4 plan" stays one folder and "../x" cannot leave the working directory.
+    Returns "" if nothing usable is left.
+    """
+    title = UNSAFE_TITLE_CHARS_RE.sub("-", title)
+    return title.strip(" .-")[:MAX_TITLE_LENGTH].strip(" .-")
+
+
 # -------------------------------
 # Save Transcript + Generate Name
 # -------------------------------
@@ -56,68 +101,78 @@ async def save_transcript(ctx: RunContext[None], file_path: str) -> str:
 
     print("\n------- Save Transcript Tool -------\n")
 
-    # Step 1 - Read transcript file
-    if not os.path.exists(file_path):
+    assigned_title = await store_transcript(file_path)
+    if assigned_title is None:
         return f"[ERROR] File '{file_path}' not found."
 
-    with open(file_path, "r") as f:
-        content = f.read()
+    return f"Transcript saved. Meeting title: {assigned_title}"
 
-    # Step 2 - Ensure database.json exists
-    if not os.path.exists("database.json"):
-        print("\n[WARN] database.json not found, creating a new one\n")
-        with open("database.json", "w") as db_file:
-            json.dump([], db_file)
 
-    # Step 3 - Load database safely
-    with open("database.json", "r+") as db_file:
-        try:
-            db_data = json.load(db_file)
-        except json.JSONDecodeError:
-            print("[\nWARN] database.json invalid, reinitializing\n")
-            db_data = []
+async def store_transcript(file_path: str) -> str | None:
+    """
+    Does the work of save_transcript and returns the meeting title,
+    or None if the transcript file does not exist.
+    File I/O runs in a worker thread, and no file is held open during the naming call.
+    """
+
+    # Step 1 - Read transcript file
+    content = await asyncio.to_thread(read_text, file_path)
+    if content is None:
+        return None
+
+    # Step 2/3 - Load database safely (created if missing)
+    db_data = await asyncio.to_thread(load_db)
+
+    # Step 4 - Check if record already exists
+    now = datetime.datetime.now().isoformat()
+    meeting = next((rec for rec in db_data if rec.get("filepath") == file_path), None)
 
-        # Step 4 - Check if record already exists
-        meeting = next((rec for rec in db_data if rec.get("filepath") == file_path), None)
+    if meeting:
+        assigned_title = meeting.get("title", "Untitled Meeting")
 
-        if meeting:
+        if meeting.get("text") == content:
+            # Nothing changed, skip rewriting database.json
+            print(f"\n[DEBUG] Transcript unchanged for {file_path}\n")
+        else:
             # Update transcript content (do NOT change title)
             meeting["text"] = content
-            meeting["updated_at"] = datetime.datetime.now().isoformat()
-            assigned_title = meeting.get("title", "Untitled Meeting")
+            meeting["updated_at"] = now
             print(f"\n[DEBUG] Updating existing record for {file_path}\n")
 
+            # Step 6 - Save DB back
+            await asyncio.to_thread(write_db, db_data)
+
+    else:
+        # Create new transcript object
+        transcript = Transcript(
+            id=len(db_data) + 1,
+            filepath=file_path,
+            text=content,
+            created_at=now,
+            updated_at=now,
+            title=None,  # will be assigned by name agent
+        )
+        db_data.append(transcript.model_dump())
+        print(f"\n[DEBUG] New record created for {file_path}\n")
+
+        # Step 5 - Use the transcript's own title line, else generate one with the naming agent
+        title_match = TITLE_LINE_RE.match(content)
+        assigned_title = clean_title(title_match.group(1)) if title_match else ""
+        if assigned_title:
+            print(f"[DEBUG] Using title line from transcript: {assigned_title}")
         else:
-            # Create new transcript object
-            transcript = Transcript(
-                id=len(db_data) + 1,
-                filepath=file_path,
-                text=content,
-                created_at=datetime.datetime.now().isoformat(),
-                updated_at=datetime.datetime.now().isoformat(),
-                title=None,  # will be assigned by name agent
-            )
-            db_data.append(transcript.model_dump())
-            print(f"\n[DEBUG] New record created for {file_path}\n")
-
-            # Step 5 - Generate meeting title using naming agent (only for new)
-            response = await naming_tool_agent.run(content)
-            meeting_name_output: MeetingName = response.output
-            assigned_title = meeting_name_output.name
-
-            # Update record
-            db_data[-1]["title"] = assigned_title
-            db_data[-1]["updated_at"] = datetime.datetime.now().isoformat()
-
-            # Move DB to meeting folder
-            move_db_to_meeting_folder(assigned_title)
-
-        # Step 6 - Save DB back
-        db_file.seek(0)
-        db_file.truncate()
-        json.dump(db_data, db_file, indent=4)
+            meeting_name_output: MeetingName = await cached_run(naming_tool_agent, content, "meeting_name")
+            assigned_title = clean_title(meeting_name_output.name) or "Untitled Meeting"
 
-    return f"Transcript saved. Meeting title: {assigned_title}"
+        # Update record
+        db_data[-1]["title"] = assigned_title
+        db_data[-1]["updated_at"] = datetime.datetime.now().isoformat()
+
+        # Step 6 - Save DB back, then move it to the meeting folder
+        await asyncio.to_thread(write_db, db_data)
+        await asyncio.to_thread(move_db_to_meeting_folder, assigned_title)
+
+    return assigned_title
 
 
 
@@ -0,0 +1,54 @@
+import json
+import os
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the standard library
+    orjson = None
+
+
+def loads(data: bytes | str):
+    """
+    Parses JSON with orjson when available, stdlib json otherwise.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(data) -> bytes:
+    """
+    Serializes JSON (indented) with orjson when available, stdlib json otherwise.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
+# -------------------------------
+# Cached database.json loader
+# -------------------------------
+@lru_cache(maxsize=8)
+def _load_db(db_path: str, mtime_ns: int, size: int) -> dict[str, dict]:
+    with open(db_path, "rb") as db_file:
+        db_data = loads(db_file.read())
+    return {meeting["filepath"]: meeting for meeting in db_data}
+
+
+def load_meetings(db_path: str) -> dict[str, dict]:
+    """
+    Returns database.json as a {filepath: meeting} dict.
+    The parsed result is cached until the file's mtime or size changes,
+    so tools running in the same pipeline parse it only once.
+    The returned dict is shared between callers and must not be mutated.
+    """
+    stat = os.stat(db_path)
+    return _load_db(db_path, stat.st_mtime_ns, stat.st_size)
+
+
+def get_meeting(db_path: str, file_path: str) -> dict | None:
+    """
+    Returns the meeting record stored for file_path, or None.
+    """
+    return load_meetings(db_path).get(file_path)
@@ -0,0 +1,91 @@
+import os
+import re
+from functools import lru_cache
+
+# -------------------------------
+# Precompiled patterns
+# -------------------------------
+_SAFE_NAME_RE = re.compile(r'[^a-zA-Z0-9_-]')
+
+# "- Feature" lines in main_features.txt -> group(1) is the feature name
+MAIN_FEATURE_LINE_RE = re.compile(r'^- [- ]*(.*?)[ \t]*$', re.M)
+
+# "1) Main Feature" lines in sub_features.txt -> group(1) is the feature name
+MAIN_FEATURE_RE = re.compile(r'^\s*\d+\)\s*(.*?)\s*$')
+
+# "   -- Sub-feature" lines -> group(1) is the leading-space indent, group(2) the stripped line
+SUB_FEATURE_RE = re.compile(r'^( *)\s*([-–•].*?)\s*$')
+
+
+@lru_cache(maxsize=1024)
+def safe_name(name: str) -> str:
+    """
+    Converts a feature name into the folder/file name used on disk
+    (lowercase, every character outside [a-z0-9_-] replaced with '_').
+    Memoized, since every stage converts the same feature names again.
+    """
+    return _SAFE_NAME_RE.sub('_', name.lower())
+
+
+def parse_sub_features(lines) -> dict[str, list[tuple[int, str]]]:
+    """
+    Parses sub_features.txt lines into {main feature: [(indent, line), ...]},
+    preserving the hierarchy through the leading-space indent of each line.
+    """
+    main_feature = None
+    sub_features_map = {}
+
+    for line in lines:
+        main_match = MAIN_FEATURE_RE.match(line)
+        if main_match:  # main feature line
+            main_feature = main_match.group(1)
+            sub_features_map[main_feature] = []
+            continue
+
+        sub_match = SUB_FEATURE_RE.match(line)
+        if sub_match and main_feature is not None:
+            indent, stripped = sub_match.groups()
+            sub_features_map[main_feature].append((len(indent), stripped))
+
+    return sub_features_map
+
+
+# -------------------------------
+# Blocking file helpers (call via asyncio.to_thread)
+# -------------------------------
+def read_text(path: str) -> str | None:
+    """
+    Returns the UTF-8 contents of a file, or None if it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def read_main_features(path: str) -> list[str] | None:
+    """
+    Returns the "- Feature" entries of main_features.txt, or None if it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return MAIN_FEATURE_LINE_RE.findall(f.read())
+
+
+def write_main_features(path: str, features: list[str]) -> None:
+    """
+    Writes main_features.txt in one write call ("- Feature" per line).
+    """
+    body = "Extracted Main Features:\n\n" + "".join(f"- {feat}\n" for feat in features)
+    with open(path, "w") as f:
+        f.write(body)
+
+
+def append_and_sync(f, text: str) -> None:
+    """
+    Appends text to an open file and forces it to disk.
+    """
+    f.write(text)
+    f.flush()
+    os.fsync(f.fileno())
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+from pydantic_ai import RunContext
+
+from db_cache import get_meeting
+from Extract_Sub_Features_Agent import expand_feature, load_completed_features
+from feature_files import append_and_sync, parse_sub_features, read_main_features, safe_name
+from Main_Feature_Detailed_Agent import extract_feature_details, save_feature_details
+from Sub_Feature_Detailed_Agent import collect_pending_blocks, extract_blocks_details
+
+logger = logging.getLogger("meeting")
+
+# -------------------------------
+# Pipeline sizing
+# -------------------------------
+MAIN_DETAIL_WORKERS = 8    # concurrent main feature detail calls
+SUB_FEATURE_WORKERS = 6    # concurrent sub-feature extraction calls
+SUB_DETAIL_WORKERS = 6     # concurrent sub-feature detail calls
+
+# Bounded queues between stages (backpressure keeps memory bounded)
+MAIN_DETAILS_QUEUE_SIZE = 4
+SUB_BLOCKS_QUEUE_SIZE = 16
+
+
+# -------------------------------
+# Feature Pipeline (steps 4 → 5 → 6 streamed)
+# -------------------------------
+async def run_feature_pipeline(ctx: RunContext[None], meeting_name: str, file_path: str) -> str:
+    """
+    Runs main feature details, sub-feature extraction and sub-feature details
+    as one streaming pipeline instead of three sequential tools.
+    Each main feature moves on to the next stage as soon as its previous stage
+    finishes; stages are connected by bounded asyncio.Queues.
+    Writes the same files as the individual tools and keeps their resume behaviour.
+    """
+
+    print("\n------- Feature Pipeline Tool -------\n")
+
+    try:
+        folder_name = meeting_name.replace(" ", "_")
+        db_path = os.path.join(folder_name, "database.json")
+        main_features_path = os.path.join(folder_name, "main_features.txt")
+        sub_features_path = os.path.join(folder_name, "sub_features.txt")
+        done_path = os.path.join(folder_name, "sub_features.done")
+
+        # -------------------------------
+        # Load transcript + main features
+        # -------------------------------
+        meeting = await asyncio.to_thread(get_meeting, db_path, file_path)
+        if not meeting:
+            return f"[DEBUG] No meeting found for file path: {file_path}"
+
+        transcript_text = meeting.get("text", "")
+        if not transcript_text:
+            return f"[DEBUG] Meeting at '{file_path}' has no transcript text."
+
+        main_features = await asyncio.to_thread(read_main_features, main_features_path)
+        if main_features is None:
+            return f"[DEBUG] No main_features.txt found in {folder_name}"
+
+        print(f"[DEBUG] Found {len(main_features)} main features.")
+
+        completed_features = await asyncio.to_thread(load_completed_features, sub_features_path, done_path)
+
+        # Sub-features already written for completed features (reused instead of asking the model again)
+        def _parse_existing() -> dict[str, list[tuple[int, str]]]:
+            if not completed_features or not os.path.exists(sub_features_path):
+                return {}
+            with open(sub_features_path, "r", encoding="utf-8") as f:
+                return parse_sub_features(f)
+
+        existing_sub_features = await asyncio.to_thread(_parse_existing)
+
+        q_main_details = asyncio.Queue(maxsize=MAIN_DETAILS_QUEUE_SIZE)
+        q_sub_blocks = asyncio.Queue(maxsize=SUB_BLOCKS_QUEUE_SIZE)
+        main_detail_sem = asyncio.Semaphore(MAIN_DETAIL_WORKERS)
+        append_lock = asyncio.Lock()
+
+        with open(sub_features_path, "a", encoding="utf-8") as sub_file, \
+                open(done_path, "a", encoding="utf-8") as done_file:
+            if sub_file.tell() == 0:
+                await asyncio.to_thread(append_and_sync, sub_file, "Extracted Hierarchical Features:\n\n")
+
+            # -------------------------------
+            # Stage 1: main feature details -> q_main_details
+            # -------------------------------
+            async def produce_main_details(idx: int, feature: str):
+                # Holding the semaphore across put() makes a full queue stall new LLM calls
+                async with main_detail_sem:
+                    try:
+                        details = await extract_feature_details(transcript_text, feature)
+                        feature_path, feature_text = await asyncio.to_thread(
+                            save_feature_details, folder_name, feature, details
+                        )
+                        logger.debug("Saved details for %s -> %s", feature, feature_path)
+                    except Exception as feature_err:
+                        print(f"[ERROR] Failed on main feature details {feature}: {feature_err}")
+                        return
+                    await q_main_details.put((idx, feature, feature_text))
+
+            # -------------------------------
+            # Stage 2: sub-feature extraction -> q_sub_blocks
+            # -------------------------------
+            async def sub_feature_worker():
+                while (item := await q_main_details.get()) is not None:
+                    idx, feature, feature_text = item
+
+                    if feature in completed_features:
+                        # Keep stage 3 consistent with what sub_features.txt already holds
+                        if feature not in existing_sub_features:
+                            print(f"[WARN] Completed feature {feature} has no block in {sub_features_path}, skipping...")
+                            continue
+                        sub_features = existing_sub_features[feature]
+                    else:
+                        try:
+                            text = await expand_feature(idx, feature, feature_text)
+                            async with append_lock:
+                                await asyncio.to_thread(append_and_sync, sub_file, text + "\n\n")
+                                await asyncio.to_thread(append_and_sync, done_file, feature + "\n")
+                            logger.debug("Appended %s → %s", feature, sub_features_path)
+                        except Exception as feature_err:
+                            print(f"[ERROR] Failed on feature {feature}: {feature_err}")
+                            continue
+
+                        # expand_feature writes exactly one canonical heading, so the block parses under this feature
+                        sub_features = parse_sub_features(text.splitlines()).get(feature, [])
+
+                    await q_sub_blocks.put((feature, feature_text, sub_features))
+
+            # -------------------------------
+            # Stage 3: sub-feature details -> per-block files
+            # -------------------------------
+            async def sub_detail_worker():
+                while (item := await q_sub_blocks.get()) is not None:
+                    feature, feature_text, sub_features = item
+                    if not sub_features:
+                        logger.debug("No sub-features for %s, skipping.", feature)
+                        continue
+
+                    try:
+                        main_folder = os.path.join(folder_name, safe_name(feature))
+                        pending_blocks = await collect_pending_blocks(main_folder, sub_features)
+                        if not pending_blocks:
+                            continue
+
+                        unique_blocks = tuple(dict.fromkeys(block for block, _, _ in pending_blocks))
+                        destinations = [(feature, block, title, path) for block, title, path in pending_blocks]
+                        await extract_blocks_details(feature, feature_text, unique_blocks, destinations)
+                    except Exception as feature_err:
+                        print(f"[ERROR] Failed on main feature {feature}: {feature_err}")
+
+            # -------------------------------
+            # Wire the stages together
+            # -------------------------------
+            async with asyncio.TaskGroup() as tg:
+                producers = [
+                    tg.create_task(produce_main_details(idx, feature))
+                    for idx, feature in enumerate(main_features, start=1)
+                ]
+                sub_workers = [tg.create_task(sub_feature_worker()) for _ in range(SUB_FEATURE_WORKERS)]
+                for _ in range(SUB_DETAIL_WORKERS):
+                    tg.create_task(sub_detail_worker())
+
+                # Shut stages down in order once their inputs are exhausted
+                await asyncio.gather(*producers)
+                for _ in sub_workers:
+                    await q_main_details.put(None)
+                await asyncio.gather(*sub_workers)
+                for _ in range(SUB_DETAIL_WORKERS):
+                    await q_sub_blocks.put(None)
+
+        return f"Feature pipeline finished; detailed files created inside {folder_name}/<main_feature> folders"
+
+    except Exception as e:
+        return f"[ERROR] {str(e)}"
@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+from contextlib import closing
+from functools import cache
+from typing import Callable, get_args, get_origin
+
+from pydantic import BaseModel
+from pydantic_ai import Agent
+
+from llm_clients import get_model, run_agent
+
+logger = logging.getLogger("meeting")
+
+# -------------------------------
+# Cache location
+# -------------------------------
+CACHE_PATH = "llm_cache.db"
+
+
+# System prompts of the agents built by cached_agent(), by id(agent)
+# (pydantic_ai has no public accessor, and Agent is not hashable)
+_SYSTEM_PROMPTS: dict[int, str] = {}
+
+
+# -------------------------------
+# SQLite helpers (run in a worker thread)
+# -------------------------------
+@cache
+def _create_schema(path: str) -> None:
+    # Once per cache file and process, not on every lookup
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, tag TEXT NOT NULL, output TEXT NOT NULL)"
+        )
+
+
+def _connect() -> sqlite3.Connection:
+    _create_schema(CACHE_PATH)
+    return sqlite3.connect(CACHE_PATH)
+
+
+def _lookup(key: str) -> str | None:
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT output FROM responses WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _store(key: str, tag: str, output: str) -> None:
+    # closing() closes the connection; the inner "with conn" commits the insert
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, tag, output) VALUES (?, ?, ?)",
+            (key, tag, output),
+        )
+
+
+# -------------------------------
+# Output hydration
+# -------------------------------
+def _construct(model_type: type[BaseModel], data: dict) -> BaseModel:
+    """
+    Rebuilds a cached output with model_construct (no validation).
+    The data was validated by the agent before it was stored, so it is trusted.
+    Nested models and lists of models are rebuilt recursively.
+    """
+
+    values = {}
+    for name, field in model_type.model_fields.items():
+        if name not in data:
+            continue
+        value = data[name]
+        annotation = field.annotation
+
+        if get_origin(annotation) is list:
+            (item_type,) = get_args(annotation)
+            if isinstance(item_type, type) and issubclass(item_type, BaseModel):
+                value = [_construct(item_type, item) for item in value]
+        elif isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            value = _construct(annotation, value)
+
+        values[name] = value
+    return model_type.model_construct(**values)
+
+
+# -------------------------------
+# Cached agents
+# -------------------------------
+def cached_agent(*, system_prompt: str, **kwargs) -> Agent:
+    """
+    Builds an Agent whose runs can go through cached_run,
+    remembering its system prompt for the cache key.
+    """
+    agent = Agent(system_prompt=system_prompt, **kwargs)
+    _SYSTEM_PROMPTS[id(agent)] = system_prompt
+    return agent
+
+
+# -------------------------------
+# Cached agent run
+# -------------------------------
+async def cached_run(agent: Agent, prompt: str, tag: str, cache_if: Callable | None = None):
+    """
+    Runs the agent with the given prompt and returns its structured output.
+    The agent must come from cached_agent().
+    Responses are stored in a local SQLite cache keyed by a SHA256 of
+    (tag, model name, model settings, system prompt, prompt), so re-running the
+    pipeline on the same transcript skips the Gemini call entirely, while a model,
+    settings or prompt change misses the cache.
+    If cache_if is given, outputs it rejects are returned but not stored,
+    so an incomplete answer is asked for again on the next run.
+    """
+
+    model_name = getattr(agent.model or get_model(), "model_name", agent.model)
+    settings = json.dumps(agent.model_settings or {}, sort_keys=True, default=str)
+    system_prompt = _SYSTEM_PROMPTS[id(agent)]
+    key = hashlib.sha256(
+        f"{tag}\0{model_name}\0{settings}\0{system_prompt}\0{prompt}".encode("utf-8")
+    ).hexdigest()
+
+    blob = await asyncio.to_thread(_lookup, key)
+    if blob is not None:
+        logger.debug("[CACHE] Hit for %s", tag)
+        return _construct(agent.output_type, json.loads(blob))
+
+    response = await run_agent(agent, prompt)
+    if cache_if is None or cache_if(response.output):
+        await asyncio.to_thread(_store, key, tag, response.output.model_dump_json())
+    return response.output
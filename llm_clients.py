@@ -0,0 +1,102 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+from functools import cache
+
+import httpx
+from dotenv import load_dotenv
+from pydantic_ai import Agent
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.models.google import GoogleModel
+from pydantic_ai.providers.google import GoogleProvider
+
+logger = logging.getLogger("meeting")
+
+# -------------------------------
+# Shared HTTP client (connection pool + keep-alive)
+# -------------------------------
+@cache
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide httpx client, built on first use.
+    HTTP/2 needs the optional 'h2' package; falls back to HTTP/1.1 without it.
+    Calls are not streamed, so no bytes arrive until generation finishes: the read
+    timeout stays as long as pydantic_ai's default client (600 s), and run_agent
+    bounds each whole call instead.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=httpx.Timeout(600, connect=5),
+    )
+
+
+# -------------------------------
+# Setup Google model provider (shared by every agent)
+# -------------------------------
+@cache
+def get_model() -> GoogleModel:
+    """
+    Loads the environment and builds the shared Gemini model on first use,
+    so importing an agent module has no side effects.
+    Agents are created without a model; run_agent passes this one in.
+    """
+    load_dotenv()
+    provider = GoogleProvider(api_key=os.getenv("GOOGLE_API_KEY"), http_client=get_http_client())
+    return GoogleModel("gemini-2.5-flash", provider=provider)
+
+
+# -------------------------------
+# Process-wide limit on in-flight Gemini calls
+# -------------------------------
+@cache
+def _agent_slots() -> asyncio.Semaphore:
+    # Per-tool semaphores only bound one stage; the pipeline runs several stages at once
+    load_dotenv()
+    return asyncio.Semaphore(int(os.getenv("AGENT_MAX_CONCURRENCY", "16")))
+
+
+# -------------------------------
+# Retry policy for agent runs
+# -------------------------------
+RUN_TIMEOUT = 300           # seconds per attempt (non-streamed generations can be long)
+MAX_ATTEMPTS = 6            # for rate limits and 5xx responses
+MAX_TIMEOUT_ATTEMPTS = 2    # for timeouts and transport errors (every resend is billed again)
+MAX_BACKOFF = 30            # seconds
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def _is_retryable(err: Exception, attempt: int, timeout_failures: int) -> bool:
+    if isinstance(err, ModelHTTPError):
+        return err.status_code in RETRY_STATUS_CODES and attempt < MAX_ATTEMPTS
+    if isinstance(err, (TimeoutError, httpx.TransportError)):
+        return timeout_failures < MAX_TIMEOUT_ATTEMPTS and attempt < MAX_ATTEMPTS
+    return False
+
+
+async def run_agent(agent: Agent, prompt: str):
+    """
+    Runs agent.run(prompt) with a per-attempt timeout, holding one of the
+    AGENT_MAX_CONCURRENCY process-wide slots (released while backing off).
+    Agents without a model of their own run on the shared get_model().
+    Rate limits (429) and 5xx responses are retried up to MAX_ATTEMPTS times with
+    jittered exponential backoff, so a throttled request cannot abort a concurrent batch.
+    Timeouts and transport errors are retried only once: a slow generation that is
+    cancelled and re-sent is billed again and usually times out again.
+    """
+    timeout_failures = 0
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            async with _agent_slots():
+                run = agent.run(prompt, model=agent.model or get_model())
+                return await asyncio.wait_for(run, timeout=RUN_TIMEOUT)
+        except Exception as err:
+            if isinstance(err, (TimeoutError, httpx.TransportError)):
+                timeout_failures += 1
+            if not _is_retryable(err, attempt, timeout_failures):
+                raise
+            delay = random.uniform(0, min(MAX_BACKOFF, 2 ** attempt))
+            logger.warning("[RETRY] Attempt %d failed (%r), retrying in %.1fs", attempt, err, delay)
+            await asyncio.sleep(delay)
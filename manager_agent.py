@@ -1,35 +1,38 @@
 import asyncio
+import logging
 import os
-from dotenv import load_dotenv
 
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.google import GoogleModel
-from pydantic_ai.providers.google import GoogleProvider
+
+try:
+    import uvloop
+except ImportError:  # uvloop is optional (and not available on Windows)
+    uvloop = None
 
 # Import sub-agents
-from database_agent import save_transcript
-from summary_agent import generate_meeting_summary
+from database_agent import save_transcript, store_transcript
+from summary_agent import MeetingSpec, analyze_meeting, generate_meeting_summaries_batch, run_meeting_analysis
 from Extract_Main_Features_Agent import extract_main_features
 from Main_Feature_Detailed_Agent import extract_main_features_details
 from Extract_Sub_Features_Agent import extract_sub_features
 from Sub_Feature_Detailed_Agent import extract_sub_features_details
+from feature_pipeline import run_feature_pipeline
+from llm_clients import get_http_client, get_model
 
-# --------- Load ENV ---------
-load_dotenv()
-
-# --------- Agent + Provider Setup ---------
-provider = GoogleProvider(api_key=os.getenv("GOOGLE_API_KEY"))
-model = GoogleModel("gemini-2.5-flash", provider=provider)
-
+# --------- Agent Setup ---------
 manager_agent = Agent(
-    model=model,
     system_prompt=(
         "You are the Manager Agent for the Meeting System.\n\n"
         "Your workflow is strictly sequential:\n"
-        "1. Save meeting → 2. Summarize meeting → 3. Extract main features "
-        "→ 4. Generate main feature details → 5. Extract sub-features → 6. Generate sub-feature details.\n\n"
+        "1. Save meeting → 2. Summarize meeting and extract main features "
+        "→ 3. Generate main feature details, sub-features and sub-feature details.\n\n"
         "Rules:\n"
-        "- Never skip or change the order.\n"
+        "- To process a transcript, call the full pipeline tool once; it runs every step in order.\n"
+        "- Use the single-step tools (main features, main feature details, sub-features, "
+        "sub-feature details) only when the user asks to re-run one stage, and never skip or change the order.\n"
+        "- The feature pipeline and the sub-feature tools resume from files already on disk; "
+        "the analyze and main features tools always redo their step.\n"
+        "- To summarize several saved meetings, use the batch summary tool.\n"
         "- Keep responses short and clear."
     ),
 )
@@ -42,65 +45,120 @@ async def save_meeting(ctx: RunContext[None], file_path: str) -> str:
     db_result = await save_transcript(ctx, file_path)
     return f"✅ Meeting saved.\nDatabase Response: {db_result}\n"
 
-# --- Tool 2: Summarize Meeting ---
+# --- Tool 2: Summary + Main Features (step 2, one call) ---
+@manager_agent.tool
+async def analyze(ctx: RunContext[None], meeting_name: str, file_path: str) -> str:
+    """Summarize the meeting and extract its main features in one call"""
+    print("\n------- Manager Analyze Meeting Tool -------\n")
+    result = await analyze_meeting(ctx, meeting_name, file_path)
+    return f"✅ Summary generated and main features extracted.\n{result}"
+
+# --- Tool 3: Feature Pipeline (step 3, streamed) ---
 @manager_agent.tool
-async def summarize_meeting(ctx: RunContext[None], meeting_name: str, file_path: str) -> str:
-    """Summarize the meeting via summary_agent"""
-    print("\n------- Manager Summarize Meeting Tool -------\n")
-    summary_result = await generate_meeting_summary(ctx, meeting_name, file_path)
-    return f"✅ Summary generated.\n{summary_result}"
+async def extract_all_details(ctx: RunContext[None], meeting_name: str, file_path: str) -> str:
+    """Run main feature details, sub-feature extraction and sub-feature details as one pipeline"""
+    print("\n------- Manager Feature Pipeline Tool -------\n")
+    result = await run_feature_pipeline(ctx, meeting_name, file_path)
+    return f"✅ Main feature details, sub-features and sub-feature details created.\n{result}"
 
-# --- Tool 3: Extract Main Features ---
+# --- Tool 4: Full Pipeline (all steps) ---
+@manager_agent.tool
+async def run_full_pipeline(ctx: RunContext[None], file_path: str) -> str:
+    """Save, summarize and extract all features for a transcript (every step in one tool)"""
+    print("\n------- Manager Full Pipeline Tool -------\n")
+
+    try:
+        meeting_name = await store_transcript(file_path)
+        if meeting_name is None:
+            return f"[ERROR] File '{file_path}' not found."
+
+        # Summary and main features come from one call over the saved transcript
+        analysis_result, main_features = await run_meeting_analysis(meeting_name, file_path)
+        if not main_features:
+            return f"Meeting title: {meeting_name}\n{analysis_result}"
+
+        # Step 3 depends on main_features.txt; the feature pipeline overlaps its stages per feature
+        pipeline_result = await run_feature_pipeline(ctx, meeting_name, file_path)
+
+        return f"✅ Meeting '{meeting_name}' processed.\n{analysis_result}\n{pipeline_result}"
+
+    except Exception as e:
+        return f"[ERROR] {str(e)}"
+
+# --- Tool 5: Summarize Several Meetings ---
+@manager_agent.tool
+async def summarize_meetings(ctx: RunContext[None], meetings: list[MeetingSpec]) -> str:
+    """Summarize several already-saved meetings at once via summary_agent"""
+    print("\n------- Manager Summarize Meetings Tool -------\n")
+    summary_results = await generate_meeting_summaries_batch(ctx, meetings)
+    return f"✅ Summaries generated.\n{summary_results}"
+
+# --- Tools 6-9: Single-step re-runs ---
 @manager_agent.tool
 async def extract_main(ctx: RunContext[None], meeting_name: str, file_path: str) -> str:
-    """Extract main features"""
+    """Re-extract only the main features (main_features.txt)"""
     print("\n------- Manager Extract Main Features Tool -------\n")
     result = await extract_main_features(ctx, meeting_name, file_path)
     return f"✅ Main features extracted.\n{result}"
 
-# --- Tool 4: Main Feature Details ---
 @manager_agent.tool
 async def extract_main_details(ctx: RunContext[None], meeting_name: str, file_path: str) -> str:
-    """Generate detailed files for main features"""
+    """Re-generate only the detailed files for main features"""
     print("\n------- Manager Main Feature Details Tool -------\n")
     result = await extract_main_features_details(ctx, meeting_name, file_path)
     return f"✅ Main feature details created.\n{result}"
 
-# --- Tool 5: Extract Sub-Features ---
 @manager_agent.tool
 async def extract_sub(ctx: RunContext[None], meeting_name: str, file_path: str) -> str:
-    """Extract sub-features"""
+    """Extract only the sub-features still missing from sub_features.txt"""
     print("\n------- Manager Extract Sub-Features Tool -------\n")
     result = await extract_sub_features(ctx, meeting_name, file_path)
     return f"✅ Sub-features extracted.\n{result}"
 
-# --- Tool 6: Sub-Feature Details ---
 @manager_agent.tool
 async def extract_sub_details(ctx: RunContext[None], meeting_name: str, file_path: str) -> str:
-    """Generate detailed files for sub-features"""
+    """Generate only the sub-feature detail files that do not exist yet"""
     print("\n------- Manager Sub-Feature Details Tool -------\n")
     result = await extract_sub_features_details(ctx, meeting_name, file_path)
     return f"✅ Sub-feature details created.\n{result}"
 
 # --- Main Interactive Loop ---
+def configure_debug_logging():
+    """Show per-item progress lines from the tools when MEETING_DEBUG=1"""
+    if os.getenv("MEETING_DEBUG") != "1":
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+    logger = logging.getLogger("meeting")
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+
 async def main():
+    configure_debug_logging()
     print("\n[DEBUG] Manager Agent interactive session started.")
     print("Type 'exit' to quit.\n")
 
     message_history = []
-    response = await manager_agent.run("Hi!", message_history=message_history)
-    print(f"{response.output}\n")
-    message_history.extend(response.new_messages())
-
-    while True:
-        user_input = input("You: ").strip()
-        if user_input.lower() in {"exit", "quit"}:
-            print("\n[DEBUG] Session ended, Goodbye!\n")
-            break
-
-        response = await manager_agent.run(user_input, message_history=message_history)
-        print(f"\n[Meeting Assistant Response]\n{response.output}\n")
+    try:
+        response = await manager_agent.run("Hi!", message_history=message_history, model=get_model())
+        print(f"{response.output}\n")
         message_history.extend(response.new_messages())
 
+        while True:
+            user_input = input("You: ").strip()
+            if user_input.lower() in {"exit", "quit"}:
+                print("\n[DEBUG] Session ended, Goodbye!\n")
+                break
+
+            response = await manager_agent.run(user_input, message_history=message_history, model=get_model())
+            print(f"\n[Meeting Assistant Response]\n{response.output}\n")
+            message_history.extend(response.new_messages())
+    finally:
+        # Close the shared connection pool used by every agent
+        await get_http_client().aclose()
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    # libuv-based event loop when installed, default asyncio loop otherwise
+    loop_factory = uvloop.new_event_loop if uvloop is not None else None
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        runner.run(main())
@@ -1,19 +1,15 @@
+import asyncio
 import json
+import logging
 import os
-from dotenv import load_dotenv
 from pydantic import BaseModel
-from pydantic_ai import Agent, RunContext
-from pydantic_ai.models.google import GoogleModel
-from pydantic_ai.providers.google import GoogleProvider
+from pydantic_ai import RunContext
 
-# -------------------------------
-# Load environment variables
-# -------------------------------
-load_dotenv()
+from db_cache import get_meeting
+from feature_files import write_main_features
+from llm_cache import cached_agent, cached_run
 
-# Setup Google model provider
-provider = GoogleProvider(api_key=os.getenv("GOOGLE_API_KEY"))
-model = GoogleModel("gemini-2.5-flash", provider=provider)
+logger = logging.getLogger("meeting")
 
 # -------------------------------
 # Models
@@ -21,6 +17,61 @@ model = GoogleModel("gemini-2.5-flash", provider=provider)
 class Summary(BaseModel):
     summary: str
 
+class MeetingAnalysis(BaseModel):
+    summary: str
+    main_features: list[str]  # list of main big-picture features
+
+class MeetingSpec(BaseModel):
+    meeting_name: str
+    file_path: str
+
+# Max number of meetings summarized at once by the batch tool
+MAX_CONCURRENCY = 8
+
+# -------------------------------
+# Summary Agent (built once, meeting name goes in the prompt)
+# -------------------------------
+summary_agent = cached_agent(
+    output_type=Summary,
+    system_prompt=(
+        "You are summarizing a meeting transcript; the meeting name is given before the transcript.\n"
+        "Summarize all the important points discussed clearly and concisely.\n"
+        "Do not add new information or opinions."
+    ),
+)
+
+# -------------------------------
+# Meeting Analysis Agent (summary + main features in one call)
+# -------------------------------
+meeting_analysis_agent = cached_agent(
+    output_type=MeetingAnalysis,
+    system_prompt=(
+        "You analyze a meeting transcript; the meeting name is given before the transcript.\n\n"
+        "Return two things:\n"
+        "1. summary: Summarize all the important points discussed clearly and concisely. "
+        "Do not add new information or opinions.\n"
+        "2. main_features: ONLY the MAIN BIG-PICTURE FEATURES discussed.\n"
+        "   - A main feature = one broad, high-level capability or functionality.\n"
+        "   - Keep each feature SHORT and ABSTRACT (no details, no examples, no subpoints).\n"
+        "   - Do NOT include sub-features, technical details, implementation notes, or action items.\n"
+        "   - Merge overlapping ideas into one unified main feature.\n"
+        "   - Limit output to a clean list of distinct, top-level features only.\n"
+    ),
+)
+
+# -------------------------------
+# Blocking file helper (call via asyncio.to_thread)
+# -------------------------------
+def save_summary(folder_name: str, meeting_name: str, summary: str) -> str:
+    """
+    Writes <folder>/summary.txt in one write call and returns its path.
+    """
+    summary_path = os.path.join(folder_name, "summary.txt")
+    with open(summary_path, "w") as summary_file:
+        summary_file.write(f"Meeting: {meeting_name}\n" + "=" * (9 + len(meeting_name)) + "\n\n" + summary)
+    return summary_path
+
+
 # -------------------------------
 # Summary Tool
 # -------------------------------
@@ -30,18 +81,16 @@ async def generate_meeting_summary(ctx: RunContext[None], meeting_name: str, fil
     saves it in database.json and also writes it into <meeting_name>_summary.txt.
     """
     
-    print("\n------- Generate Meeting Summary Tool -------\n")
+    # Runs once per meeting inside the batch tool, so this stays off stdout
+    logger.debug("Generate Meeting Summary: %s", meeting_name)
     
     try:
         
         folder_name = meeting_name.replace(" ", "_")
         db_path = os.path.join(folder_name, "database.json")
         
-        with open(db_path, "r") as db_file:
-            db_data = json.load(db_file)
-
-        # Find the meeting
-        meeting = next((rec for rec in db_data if rec.get("filepath") == file_path), None)
+        # Find the meeting (parsed once per file change, indexed by filepath)
+        meeting = await asyncio.to_thread(get_meeting, db_path, file_path)
         if not meeting:
             return f"[DEBUG] Meeting '{meeting_name}' not found."
 
@@ -49,28 +98,12 @@ async def generate_meeting_summary(ctx: RunContext[None], meeting_name: str, fil
         if not transcript_text:
             return f"[DEBUG] Meeting '{meeting_name}' has no transcript text to summarize."
 
-        # Create a contextual sub-agent for this specific summary
-        contextual_summary_agent = Agent(
-            model,
-            output_type=Summary,
-            system_prompt=(
-                f"You are summarizing the following meeting transcript for '{meeting_name}'.\n"
-                f"Summarize all the important points discussed clearly and concisely.\n"
-                f"Do not add new information or opinions."
-            ),
-            tools=[] 
-        )
-
-        # Run contextual agent → returns Summary model
-        response = await contextual_summary_agent.run(transcript_text)
-        summary_output: Summary = response.output
+        # Run summary agent → returns Summary model
+        prompt_input = f"Meeting: {meeting_name}\n\nTranscript:\n{transcript_text}"
+        summary_output: Summary = await cached_run(summary_agent, prompt_input, "summary")
 
        # Save summary into the same folder as database.json
-        summary_path = os.path.join(folder_name, "summary.txt")
-        with open(summary_path, "w") as summary_file:
-            summary_file.write(f"Meeting: {meeting_name}\n")
-            summary_file.write("=" * (9 + len(meeting_name)) + "\n\n")
-            summary_file.write(summary_output.summary)
+        await asyncio.to_thread(save_summary, folder_name, meeting_name, summary_output.summary)
 
         return f"\n\nSummary for meeting '{meeting_name}' saved in {file_path}"
 
@@ -78,3 +111,92 @@ async def generate_meeting_summary(ctx: RunContext[None], meeting_name: str, fil
         return "[ERROR] Database file not found."
     except json.JSONDecodeError:
         return "[ERROR] Error decoding database JSON."
+
+
+# -------------------------------
+# Meeting Analysis Tool (steps 2 + 3 fused)
+# -------------------------------
+async def analyze_meeting(ctx: RunContext[None], meeting_name: str, file_path: str) -> str:
+    """
+    Generates the meeting summary and the main features in one model call,
+    sending the transcript once instead of twice.
+    Writes summary.txt and main_features.txt like the two separate tools.
+    """
+
+    print("\n------- Analyze Meeting Tool -------\n")
+
+    try:
+        report, _ = await run_meeting_analysis(meeting_name, file_path)
+        return report
+
+    except LookupError as e:
+        return f"[DEBUG] {str(e)}"
+    except FileNotFoundError:
+        return "[ERROR] Database file not found."
+    except json.JSONDecodeError:
+        return "[ERROR] Error decoding database JSON."
+    except Exception as e:
+        return f"[ERROR] {str(e)}"
+
+
+async def run_meeting_analysis(meeting_name: str, file_path: str) -> tuple[str, list[str]]:
+    """
+    Does the work of analyze_meeting and returns (status report, main features).
+    The list is empty if the model found no main features (summary.txt is still written).
+    Raises LookupError if the meeting or its transcript text is missing.
+    """
+    folder_name = meeting_name.replace(" ", "_")
+    db_path = os.path.join(folder_name, "database.json")
+
+    meeting = await asyncio.to_thread(get_meeting, db_path, file_path)
+    if not meeting:
+        raise LookupError(f"Meeting '{meeting_name}' not found.")
+
+    transcript_text = meeting.get("text", "")
+    if not transcript_text:
+        raise LookupError(f"Meeting '{meeting_name}' has no transcript text to analyze.")
+
+    prompt_input = f"Meeting: {meeting_name}\n\nTranscript:\n{transcript_text}"
+    analysis: MeetingAnalysis = await cached_run(meeting_analysis_agent, prompt_input, "meeting_analysis")
+
+    summary_path = await asyncio.to_thread(save_summary, folder_name, meeting_name, analysis.summary)
+    print(f"\n[DEBUG] Extracted Main Features: {analysis.main_features}\n")
+
+    if not analysis.main_features:
+        return f"[DEBUG] Summary saved in {summary_path}, but no main features found in transcript.", []
+
+    feature_path = os.path.join(folder_name, "main_features.txt")
+    await asyncio.to_thread(write_main_features, feature_path, analysis.main_features)
+
+    report = (
+        f"Summary saved in {summary_path}\n"
+        f"Main features extracted: {len(analysis.main_features)}\nSaved in {feature_path}"
+    )
+    return report, analysis.main_features
+
+
+# -------------------------------
+# Batch Summary Tool
+# -------------------------------
+async def generate_meeting_summaries_batch(ctx: RunContext[None], meetings: list[MeetingSpec]) -> str:
+    """
+    Summarizes several meetings concurrently (at most MAX_CONCURRENCY at a time)
+    and returns one status line per meeting.
+    """
+
+    print("\n------- Generate Meeting Summaries Batch Tool -------\n")
+
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def _one(spec: MeetingSpec) -> str:
+        async with sem:
+            return await generate_meeting_summary(ctx, spec.meeting_name, spec.file_path)
+
+    results = await asyncio.gather(*[_one(spec) for spec in meetings], return_exceptions=True)
+
+    lines = []
+    for spec, result in zip(meetings, results):
+        if isinstance(result, Exception):
+            result = f"[ERROR] {str(result)}"
+        lines.append(f"{spec.meeting_name}: {result.strip()}")
+    return "\n".join(lines)